@@ -1,236 +1,502 @@
-import os, re, time, logging
-from typing import Dict, Any, Optional, Tuple
-from flask import Flask, request, abort
+import os, re, time, json, hashlib, hmac, asyncio, logging
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Dict, Any, List, Mapping, Optional, Tuple
+import httpx
+from cachetools import TTLCache
+from xml.sax.saxutils import escape
+from fastapi import FastAPI, Form, HTTPException, Response
 from dotenv import load_dotenv
 
-# Twilio reply helper (TwiML)
-from twilio.twiml.messaging_response import MessagingResponse
-
 # OpenAI client is used for BOTH OpenAI and Groq (Groq exposes an OpenAI-compatible API).
 try:
-    from openai import OpenAI
+    from openai import AsyncOpenAI
+except Exception:
+    AsyncOpenAI = None  # we'll handle gracefully
+
+# Redis is optional: sessions fall back to process memory when it's missing.
+try:
+    import redis.asyncio as aioredis
 except Exception:
-    OpenAI = None  # we'll handle gracefully
+    aioredis = None
 
 load_dotenv()
 
 # ---- Config from environment -------------------------------------------------
 APP_NAME = os.getenv("APP_NAME", "ZP WhatsApp Bot")
 ADMIN_PASSCODE = os.getenv("ADMIN_PASSCODE", "1234")
+_ADMIN_PASSCODE_B = ADMIN_PASSCODE.encode("utf-8")
+
+@dataclass(frozen=True)
+class LLMConfig:
+    """LLM settings, read from the environment once at startup."""
+    provider: str                   # "groq" | "openai" | "" (pick by available key)
+    openai_api_key: str
+    groq_api_key: str
+    openai_base_url: Optional[str]
+    groq_base_url: str
+    openai_model: str
+    groq_model: str
+
+    @classmethod
+    def from_env(cls) -> "LLMConfig":
+        override = os.getenv("AI_MODEL", "").strip()  # applies to either provider
+        return cls(
+            provider=(os.getenv("LLM_PROVIDER") or "").strip().lower(),
+            # Keys (set only what you use)
+            openai_api_key=os.getenv("OPENAI_API_KEY", "").strip(),
+            groq_api_key=os.getenv("GROQ_API_KEY", "").strip(),
+            # Optional base URLs
+            openai_base_url=os.getenv("OPENAI_BASE_URL", "").strip() or None,
+            groq_base_url=os.getenv("GROQ_BASE_URL", "").strip() or "https://api.groq.com/openai/v1",
+            openai_model=override or os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
+            groq_model=override or os.getenv("GROQ_MODEL", "llama-3.1-70b-versatile"),
+        )
 
-# LLM provider: "groq" or "openai" (leave blank to disable AI fallback)
-LLM_PROVIDER = (os.getenv("LLM_PROVIDER") or "").strip().lower()
-
-# Keys (set only what you use)
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "").strip()
-GROQ_API_KEY = os.getenv("GROQ_API_KEY", "").strip()
-
-# Optional base URLs
-OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "").strip() or None
-GROQ_BASE_URL = os.getenv("GROQ_BASE_URL", "").strip() or "https://api.groq.com/openai/v1"
-
-# Optional explicit model override
-AI_MODEL_OVERRIDE = os.getenv("AI_MODEL", "").strip()
+    def resolve_provider(self) -> Optional[str]:
+        # Explicit provider selection
+        if self.provider == "groq" and self.groq_api_key:
+            return "groq"
+        if self.provider == "openai" and self.openai_api_key:
+            return "openai"
+        # Auto-select by available key (prefer Groq)
+        if self.groq_api_key:
+            return "groq"
+        if self.openai_api_key:
+            return "openai"
+        return None
+
+
+LLM_CONFIG = LLMConfig.from_env()
+
+# Session storage: set REDIS_URL to share sessions across workers/restarts
+REDIS_URL = os.getenv("REDIS_URL", "").strip()
+SESSION_TTL = int(os.getenv("SESSION_TTL", "1800"))  # seconds of inactivity
+SESSION_PREFIX = "sess:"
+HISTORY_TURNS = 10  # user+bot pairs kept per session
+SWEEP_INTERVAL = 900  # seconds between in-memory session sweeps
+
+# AI answers are reused for identical (normalized) questions
+AI_CACHE_TTL = int(os.getenv("AI_CACHE_TTL", "3600"))
+AI_CACHE_PREFIX = "ai:"
+
+# Limits for the streamed AI answer (WhatsApp replies should stay short)
+AI_MAX_TOKENS = 200
+AI_MAX_SENTENCES = 4  # prompt asks for ≤3, plus the optional "verify locally" note
+AI_MAX_CHARS = 600
+# Whole-call budget for the LLM (all retries + streaming). Twilio abandons the
+# webhook after 15 s, so leave headroom for the rest of the request.
+AI_DEADLINE = 10.0
 
 # ------------------------------------------------------------------------------
-# In-memory sessions (swap for Redis/DB in production)
+# In-memory sessions (used when Redis is not configured)
 SESSIONS: Dict[str, Dict[str, Any]] = {}
 
-app = Flask(__name__)
 logging.basicConfig(level=logging.INFO)
 
 
 # ---- LLM wiring --------------------------------------------------------------
-def build_ai_client() -> Tuple[Optional[str], Optional[Any], str]:
+def build_ai_client(cfg: LLMConfig = LLM_CONFIG) -> Tuple[Optional[str], Optional[Any], str]:
     """
     Returns: (provider, client, model_name)
     provider: "groq" | "openai" | None
-    client:   OpenAI client object (or None)
+    client:   AsyncOpenAI client object (or None)
     model:    resolved model string
     """
-    if OpenAI is None:
+    if AsyncOpenAI is None:
         return None, None, ""
 
-    # Explicit provider selection
-    if LLM_PROVIDER == "groq" and GROQ_API_KEY:
-        client = OpenAI(api_key=GROQ_API_KEY, base_url=GROQ_BASE_URL)
-        model = AI_MODEL_OVERRIDE or os.getenv("GROQ_MODEL", "llama-3.1-70b-versatile")
-        return "groq", client, model
-
-    if LLM_PROVIDER == "openai" and OPENAI_API_KEY:
-        client = OpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL)
-        model = AI_MODEL_OVERRIDE or os.getenv("OPENAI_MODEL", "gpt-4o-mini")
-        return "openai", client, model
-
-    # Auto-select by available key (prefer Groq)
-    if GROQ_API_KEY:
-        client = OpenAI(api_key=GROQ_API_KEY, base_url=GROQ_BASE_URL)
-        model = AI_MODEL_OVERRIDE or os.getenv("GROQ_MODEL", "llama-3.1-70b-versatile")
-        return "groq", client, model
+    provider = cfg.resolve_provider()
+    if provider is None:
+        return None, None, ""
 
-    if OPENAI_API_KEY:
-        client = OpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL)
-        model = AI_MODEL_OVERRIDE or os.getenv("OPENAI_MODEL", "gpt-4o-mini")
-        return "openai", client, model
+    # One pooled HTTP/2 connection set shared by all requests, so the TLS
+    # handshake to the provider is paid once instead of per webhook.
+    http_client = httpx.AsyncClient(
+        http2=True,
+        timeout=10.0,
+        limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+    )
+    # Keep retries low; ai_answer() bounds the whole call with AI_DEADLINE anyway.
+    if provider == "groq":
+        client = AsyncOpenAI(
+            api_key=cfg.groq_api_key, base_url=cfg.groq_base_url,
+            http_client=http_client, max_retries=1,
+        )
+        return "groq", client, cfg.groq_model
 
-    return None, None, ""
+    client = AsyncOpenAI(
+        api_key=cfg.openai_api_key, base_url=cfg.openai_base_url,
+        http_client=http_client, max_retries=1,
+    )
+    return "openai", client, cfg.openai_model
 
 
 # Try to init AI client, but don't let it crash the app
 try:
     AI_PROVIDER, AI_CLIENT, AI_MODEL = build_ai_client()
     if AI_PROVIDER:
-        app.logger.info(f"AI provider: {AI_PROVIDER}, model: {AI_MODEL}")
+        logging.info(f"AI provider: {AI_PROVIDER}, model: {AI_MODEL}")
     else:
-        app.logger.info("AI disabled (no provider/key).")
+        logging.info("AI disabled (no provider/key).")
 except Exception as e:
     AI_PROVIDER, AI_CLIENT, AI_MODEL = None, None, ""
     logging.exception("AI init error (continuing without AI): %s", e)
 
 
+# ---- Session store -----------------------------------------------------------
+def build_redis() -> Optional[Any]:
+    if aioredis is None or not REDIS_URL:
+        return None
+    return aioredis.Redis.from_url(REDIS_URL, decode_responses=True)
+
+
+try:
+    R = build_redis()
+    logging.info("Sessions: %s", "redis" if R is not None else "in-memory")
+except Exception as e:
+    R = None
+    logging.exception("Redis init error (using in-memory sessions): %s", e)
+
+
+def new_session() -> Dict[str, Any]:
+    now = time.time()
+    return {
+        "created_at": now,
+        "updated_at": now,
+        "context": {},
+        "last_intent": None,
+        "history": deque(maxlen=2 * HISTORY_TURNS)
+    }
+
+async def session_for(wa_from: str) -> Dict[str, Any]:
+    if R is None:
+        sess = SESSIONS.get(wa_from)
+        if sess is None or time.time() - sess["updated_at"] > SESSION_TTL:
+            sess = SESSIONS[wa_from] = new_session()
+        return sess
+    data = await R.get(SESSION_PREFIX + wa_from)
+    if not data:
+        return new_session()
+    sess = json.loads(data)
+    sess["history"] = deque(sess["history"], maxlen=2 * HISTORY_TURNS)
+    return sess
+
+async def save_session(wa_from: str, sess: Dict[str, Any]) -> None:
+    sess["updated_at"] = time.time()
+    if R is None:
+        SESSIONS[wa_from] = sess
+        return
+    data = json.dumps({**sess, "history": list(sess["history"])})
+    await R.setex(SESSION_PREFIX + wa_from, SESSION_TTL, data)
+
+async def drop_session(wa_from: str) -> None:
+    if R is None:
+        SESSIONS.pop(wa_from, None)
+        return
+    await R.delete(SESSION_PREFIX + wa_from)
+
+async def session_count() -> int:
+    if R is None:
+        return len(SESSIONS)
+    n = 0
+    async for _ in R.scan_iter(match=SESSION_PREFIX + "*", count=500):
+        n += 1
+    return n
+
+async def clear_sessions() -> None:
+    if R is None:
+        SESSIONS.clear()
+        return
+    # Only our keys: the Redis DB may be shared with other apps.
+    batch = []
+    async for key in R.scan_iter(match=SESSION_PREFIX + "*", count=500):
+        batch.append(key)
+        if len(batch) >= 500:
+            await R.unlink(*batch)
+            batch.clear()
+    if batch:
+        await R.unlink(*batch)
+
+def sweep_sessions() -> int:
+    """Drop in-memory sessions idle longer than SESSION_TTL; returns # evicted."""
+    now = time.time()
+    dead = [k for k, v in SESSIONS.items() if now - v["updated_at"] > SESSION_TTL]
+    for k in dead:
+        SESSIONS.pop(k, None)
+    return len(dead)
+
+async def session_sweeper() -> None:
+    while True:
+        await asyncio.sleep(SWEEP_INTERVAL)
+        try:
+            n = sweep_sessions()
+            if n:
+                logging.info("Swept %d idle sessions", n)
+        except Exception as e:
+            logging.exception("Session sweep error: %s", e)
+
+
 # ---- Helpers -----------------------------------------------------------------
-def normalize(text: str) -> str:
-    return re.sub(r"\s+", " ", (text or "").strip()).lower()
-
-def reply_text(body: str) -> str:
-    resp = MessagingResponse()
-    resp.message(body)
-    return str(resp)
-
-def session_for(wa_from: str) -> Dict[str, Any]:
-    if wa_from not in SESSIONS:
-        SESSIONS[wa_from] = {
-            "created_at": time.time(),
-            "context": {},
-            "last_intent": None,
-            "history": []
-        }
-    return SESSIONS[wa_from]
-
-def small_menu() -> str:
-    return (
-        f"*{APP_NAME}*\n"
-        "Type a number or keyword:\n"
-        "1) Schemes & Eligibility\n"
-        "2) Lodge a grievance\n"
-        "3) Check application status\n"
-        "4) Contact / Office hours\n"
-        "5) Help (commands)\n"
-        "_Tip: send ‘menu’ anytime._"
-    )
+# ASCII whitespace other than the space itself -> " "
+_WS_TRANS = str.maketrans(dict.fromkeys(map(ord, "\t\n\r\v\f\x1c\x1d\x1e\x1f"), " "))
 
-def help_text() -> str:
-    return (
-        "Commands:\n"
-        "• menu — main options\n"
-        "• schemes — PMAY, JJM, SHG, etc.\n"
-        "• status <ID> — check an application (demo)\n"
-        "• grievance — file a grievance (demo)\n"
-        "• stop — forget my session\n"
-        "• admin <pass> ping|stats|reset — admin ops\n"
-        "For general questions, reply in English/Marathi/Hindi."
-    )
+# Same envelope Twilio's MessagingResponse emits for a single <Message>, pre-encoded
+_TWIML_HEAD = b'<?xml version="1.0" encoding="UTF-8"?><Response><Message>'
+_TWIML_TAIL = b"</Message></Response>"
 
-def schemes_text() -> str:
-    return (
-        "*Schemes (demo)*\n"
-        "• PMAY-G: Rural housing support\n"
-        "• JJM: Functional tap connection\n"
-        "• SHG: Livelihood & credit linkages\n"
-        "• MGNREGS: Wage employment\n"
-        "_Reply with ‘eligibility <scheme> <your details>’ for a quick check (demo)._"
+def normalize(text: str) -> str:
+    s = (text or "").translate(_WS_TRANS).strip().lower()
+    # Typical ASCII message with single spaces is already done; otherwise collapse
+    # runs (and Unicode whitespace such as NBSP) the slow way.
+    if "  " in s or not s.isascii():
+        s = " ".join(s.split())
+    return s
+
+def reply_text(body: str) -> bytes:
+    return _TWIML_HEAD + escape(body).encode() + _TWIML_TAIL
+
+SMALL_MENU = (
+    f"*{APP_NAME}*\n"
+    "Type a number or keyword:\n"
+    "1) Schemes & Eligibility\n"
+    "2) Lodge a grievance\n"
+    "3) Check application status\n"
+    "4) Contact / Office hours\n"
+    "5) Help (commands)\n"
+    "_Tip: send ‘menu’ anytime._"
+)
+
+HELP_TEXT = (
+    "Commands:\n"
+    "• menu — main options\n"
+    "• schemes — PMAY, JJM, SHG, etc.\n"
+    "• status <ID> — check an application (demo)\n"
+    "• grievance — file a grievance (demo)\n"
+    "• stop — forget my session\n"
+    "• admin <pass> ping|stats|reset — admin ops\n"
+    "For general questions, reply in English/Marathi/Hindi."
+)
+
+SCHEMES_TEXT = (
+    "*Schemes (demo)*\n"
+    "• PMAY-G: Rural housing support\n"
+    "• JJM: Functional tap connection\n"
+    "• SHG: Livelihood & credit linkages\n"
+    "• MGNREGS: Wage employment\n"
+    "_Reply with ‘eligibility <scheme> <your details>’ for a quick check (demo)._"
+)
+
+CONTACT_TEXT = (
+    "*Contact (demo)*\n"
+    "• Zilla Parishad Helpline: 1800-000-000\n"
+    "• Office hours: Mon–Fri 10:30–17:30\n"
+    "• Email: help@zp.example.in\n"
+    "_Replace with real contacts before going live._"
+)
+
+GRIEVANCE_PROMPT = (
+    "*Grievance (demo)*\n"
+    "Reply in this format:\n"
+    "`grievance <name> <village> <issue>`\n"
+    "Example: `grievance Priya Pal Khadakde water not reaching last mile`\n"
+    "You’ll get a ticket ID back."
+)
+
+STATUS_PROMPT = "Send: `status <APPLICATION_ID>`\nExample: `status PMAY123`"
+
+NO_MATCH_TEXT = "I didn’t catch that. Here’s the menu:\n\n" + SMALL_MENU
+
+# Fixed replies are rendered to TwiML once per process
+_CANNED_TWIML = {
+    text: reply_text(text)
+    for text in (
+        SMALL_MENU, HELP_TEXT, SCHEMES_TEXT, CONTACT_TEXT,
+        GRIEVANCE_PROMPT, STATUS_PROMPT, NO_MATCH_TEXT,
     )
+}
 
-def contact_text() -> str:
-    return (
-        "*Contact (demo)*\n"
-        "• Zilla Parishad Helpline: 1800-000-000\n"
-        "• Office hours: Mon–Fri 10:30–17:30\n"
-        "• Email: help@zp.example.in\n"
-        "_Replace with real contacts before going live._"
-    )
+# Demo application records: ID (uppercase) -> (status, note)
+_STATUS_TABLE: Mapping[str, Tuple[str, str]] = {
+    "PMAY123": ("Under review", "Verification within 7 days"),
+    "JJM456": ("Approved", "Connection expected in 30 days"),
+    "SHG789": ("Pending docs", "Please submit bank passbook copy"),
+}
 
 def status_lookup(app_id: str) -> str:
-    fake = {
-        "PMAY123": ("Under review", "Verification within 7 days"),
-        "JJM456": ("Approved", "Connection expected in 30 days"),
-        "SHG789": ("Pending docs", "Please submit bank passbook copy"),
-    }
-    st = fake.get(app_id.upper())
+    st = _STATUS_TABLE.get(app_id.upper())
     if not st:
         return f"No record found for *{app_id}*. Check the ID and try again."
     return f"*Status for {app_id}:* {st[0]}\nNote: {st[1]}"
 
-def admin_ops(parts):
-    if len(parts) < 3:
+async def _admin_ping() -> str:
+    return "pong ✅"
+
+async def _admin_stats() -> str:
+    return f"Sessions: {await session_count()}"
+
+async def _admin_reset() -> str:
+    await clear_sessions()
+    return "All sessions cleared."
+
+_ADMIN_CMDS = {
+    "ping": _admin_ping,
+    "stats": _admin_stats,
+    "reset": _admin_reset,
+}
+
+async def admin_ops(args):
+    if len(args) < 2:
         return "Usage: admin <passcode> <ping|stats|reset>"
-    if parts[1] != ADMIN_PASSCODE:
+    # Constant-time compare so response timing doesn't leak the passcode
+    if not hmac.compare_digest(args[0].encode("utf-8"), _ADMIN_PASSCODE_B):
         return "Admin: invalid passcode."
-    cmd = parts[2]
-    if cmd == "ping":
-        return "pong ✅"
-    if cmd == "stats":
-        return f"Sessions: {len(SESSIONS)}"
-    if cmd == "reset":
-        SESSIONS.clear()
-        return "All sessions cleared."
-    return "Unknown admin command."
-
-def trivial_intents(text: str, sess: Dict[str, Any]) -> Optional[str]:
-    t = normalize(text)
+    cmd = _ADMIN_CMDS.get(args[1])
+    if cmd is None:
+        return "Unknown admin command."
+    return await cmd()
+
+# Whole-message keywords in one anchored alternation; the named group that matched
+# is the intent. Input is already normalize()d (lowercase, single spaces, stripped).
+_INTENT_RE = re.compile(
+    r"(?P<schemes>1|schemes?|yojana)"
+    r"|(?P<grievance>2|grievance|complaint)"
+    r"|(?P<status>3|status)"
+    r"|(?P<contact>4|contact)"
+    r"|(?P<help>5|help)"
+    r"|(?P<menu>menu|start|hi|hello|namaste|नमस्ते|नमस्कार)"
+    r"|(?P<stop>stop)"
+)
+
+# Intents that just send a fixed reply
+_STATIC_INTENTS = {
+    "schemes": SCHEMES_TEXT,
+    "grievance": GRIEVANCE_PROMPT,
+    "status": STATUS_PROMPT,
+    "contact": CONTACT_TEXT,
+    "help": HELP_TEXT,
+    "menu": SMALL_MENU,
+}
+
+# "<command> <args>" handlers: (args from normalized text, raw text, session)
+async def _handle_status(tail: str, text: str, sess: Dict[str, Any]) -> str:
+    sess["last_intent"] = "status_lookup"
+    return status_lookup(tail)
+
+async def _handle_grievance(tail: str, text: str, sess: Dict[str, Any]) -> str:
+    # Keep the user's original casing for the grievance details
+    payload = text.strip()[len("grievance "):].strip()
+    if len(payload) < 4:
+        return "Please include details: `grievance <name> <village> <issue>`"
+    ticket = f"GRV{int(time.time())%100000:05d}"
+    sess["last_intent"] = "grievance_ticket"
+    sess["context"]["last_ticket"] = ticket
+    return (
+        f"Thanks. Ticket *{ticket}* created (demo).\n"
+        "You’ll receive an update after initial triage."
+    )
 
-    if t in {"1", "schemes", "scheme", "yojana"}:
-        sess["last_intent"] = "schemes"
-        return schemes_text()
-    if t in {"2", "grievance", "complaint"}:
-        sess["last_intent"] = "grievance"
-        return (
-            "*Grievance (demo)*\n"
-            "Reply in this format:\n"
-            "`grievance <name> <village> <issue>`\n"
-            "Example: `grievance Priya Pal Khadakde water not reaching last mile`\n"
-            "You’ll get a ticket ID back."
-        )
-    if t in {"3", "status"}:
-        sess["last_intent"] = "status"
-        return "Send: `status <APPLICATION_ID>`\nExample: `status PMAY123`"
-    if t in {"4", "contact"}:
-        sess["last_intent"] = "contact"
-        return contact_text()
-    if t in {"5", "help"}:
-        sess["last_intent"] = "help"
-        return help_text()
-    if t in {"menu", "start", "hi", "hello", "namaste", "नमस्ते", "नमस्कार"}:
-        sess["last_intent"] = "menu"
-        return small_menu()
-
-    if t.startswith("status "):
-        app_id = t.split(" ", 1)[1].strip()
-        sess["last_intent"] = "status_lookup"
-        return status_lookup(app_id)
-
-    if t.startswith("grievance "):
-        payload = text.strip()[len("grievance "):].strip()
-        if len(payload) < 4:
-            return "Please include details: `grievance <name> <village> <issue>`"
-        ticket = f"GRV{int(time.time())%100000:05d}"
-        sess["last_intent"] = "grievance_ticket"
-        sess["context"]["last_ticket"] = ticket
-        return (
-            f"Thanks. Ticket *{ticket}* created (demo).\n"
-            "You’ll receive an update after initial triage."
-        )
+async def _handle_admin(tail: str, text: str, sess: Dict[str, Any]) -> str:
+    return await admin_ops(tail.split())
 
-    if t.startswith("admin "):
-        return admin_ops(t.split())
+_PREFIX_HANDLERS = {
+    "status": _handle_status,
+    "grievance": _handle_grievance,
+    "admin": _handle_admin,
+}
 
-    if t == "stop":
-        SESSIONS.pop(sess.get("id",""), None)
-        return "Session cleared. Send ‘menu’ to start again."
+async def trivial_intents(text: str, sess: Dict[str, Any]) -> Optional[str]:
+    t = normalize(text)
 
-    return None
+    m = _INTENT_RE.fullmatch(t)
+    if m is not None:
+        intent = m.lastgroup
+        if intent == "stop":
+            sess["last_intent"] = "stop"
+            await drop_session(sess.get("id", ""))
+            return "Session cleared. Send ‘menu’ to start again."
+        sess["last_intent"] = intent
+        return _STATIC_INTENTS[intent]
+
+    head, _, tail = t.partition(" ")
+    handler = _PREFIX_HANDLERS.get(head)
+    if handler is None or not tail:
+        return None
+    return await handler(tail, text, sess)
+
+# Per-process cache, used when Redis is not configured
+_AI_CACHE: TTLCache = TTLCache(maxsize=4096, ttl=AI_CACHE_TTL)
+
+# The cache is best-effort: a Redis error counts as a miss / skipped write.
+async def ai_cache_get(key: str) -> Optional[str]:
+    if R is None:
+        return _AI_CACHE.get(key)
+    try:
+        return await R.get(AI_CACHE_PREFIX + hashlib.sha1(key.encode()).hexdigest())
+    except Exception as e:
+        logging.exception("AI cache read error: %s", e)
+        return None
 
-def ai_answer(user_text: str, sess: Dict[str, Any]) -> str:
+async def ai_cache_set(key: str, answer: str) -> None:
+    if R is None:
+        _AI_CACHE[key] = answer
+        return
+    try:
+        await R.setex(AI_CACHE_PREFIX + hashlib.sha1(key.encode()).hexdigest(), AI_CACHE_TTL, answer)
+    except Exception as e:
+        logging.exception("AI cache write error: %s", e)
+
+# End of a sentence: terminator (incl. Devanagari danda) followed by whitespace.
+# A "." after a number or a one/two-letter word is a list marker or abbreviation
+# ("1. ", "Rs. ", "e.g. "), not a sentence end.
+_SENTENCE_END_RE = re.compile(r"(?:(?<!\d)(?<!\b\w)(?<!\b\w\w)\.|[!?।])(?=\s)")
+
+def answer_cutoff(text: str) -> int:
+    """Where to cut a partially streamed answer, or 0 to keep reading."""
+    n = last_end = 0
+    for m in _SENTENCE_END_RE.finditer(text):
+        n += 1
+        if n == AI_MAX_SENTENCES:
+            return m.end()
+        if m.end() <= AI_MAX_CHARS:
+            last_end = m.end()
+    if len(text) < AI_MAX_CHARS:
+        return 0
+    # Too long: back off to the last sentence end, else the last word break
+    if last_end:
+        return last_end
+    words = text[:AI_MAX_CHARS].rsplit(None, 1)
+    return len(words[0]) if len(words) == 2 else AI_MAX_CHARS
+
+def is_askable(text: str) -> bool:
+    """Cheap gate before the LLM: skip typos, emoji-only and one-word messages."""
+    return len(text.split()) >= 2 and sum(c.isalpha() for c in text) >= 3
+
+async def _stream_answer(messages: List[Dict[str, str]]) -> str:
+    # Stream so we can reply as soon as the answer is long enough
+    stream = await AI_CLIENT.chat.completions.create(
+        model=AI_MODEL,
+        messages=messages,
+        temperature=0.2,
+        max_tokens=AI_MAX_TOKENS,
+        stream=True,
+    )
+    buf = ""
+    try:
+        async for chunk in stream:
+            if not chunk.choices or not chunk.choices[0].delta.content:
+                continue
+            buf += chunk.choices[0].delta.content
+            cut = answer_cutoff(buf)
+            if cut:
+                buf = buf[:cut]
+                break
+    finally:
+        await stream.close()  # stop generation and free the pooled connection
+    return buf.strip()
+
+async def ai_answer(user_text: str, sess: Dict[str, Any]) -> str:
     """
     AI fallback via Groq or OpenAI (OpenAI-compatible).
     Returns empty string if AI is disabled or unavailable.
@@ -238,6 +504,11 @@ def ai_answer(user_text: str, sess: Dict[str, Any]) -> str:
     if AI_CLIENT is None or AI_PROVIDER is None:
         return ""
 
+    key = normalize(user_text)
+    cached = await ai_cache_get(key)
+    if cached:
+        return cached
+
     try:
         system = (
             "You are a helpful district e-governance assistant. "
@@ -251,43 +522,72 @@ def ai_answer(user_text: str, sess: Dict[str, Any]) -> str:
             {"role": "user", "content": user_text}
         ]
 
-        result = AI_CLIENT.chat.completions.create(
-            model=AI_MODEL,
-            messages=messages,
-            temperature=0.2,
-        )
-        return (result.choices[0].message.content or "").strip()
+        # httpx timeouts are per operation (and per chunk when streaming), so put
+        # one deadline around the request, its retries and the stream.
+        answer = await asyncio.wait_for(_stream_answer(messages), AI_DEADLINE)
+    except asyncio.TimeoutError:
+        logging.warning("AI timed out after %gs", AI_DEADLINE)
+        return ""
     except Exception as e:
         logging.exception("AI error: %s", e)
         return ""
 
+    if answer:
+        await ai_cache_set(key, answer)
+    return answer
+
 
 # ---- Routes ------------------------------------------------------------------
-@app.route("/", methods=["GET"])
-def health():
-    return f"{APP_NAME} is up"
-
-@app.route("/whatsapp", methods=["POST"])
-def whatsapp_webhook():
-    wa_from = request.values.get("From", "")
-    body = request.values.get("Body", "")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Redis expires sessions itself; only the in-memory store needs sweeping.
+    sweeper = asyncio.create_task(session_sweeper()) if R is None else None
+    yield
+    if sweeper is not None:
+        sweeper.cancel()
+    if AI_CLIENT is not None:
+        await AI_CLIENT.close()  # closes the pooled httpx connections
+    if R is not None:
+        await R.aclose()
+
+# Public webhook: no interactive docs or schema endpoints
+app = FastAPI(
+    title=APP_NAME, lifespan=lifespan,
+    docs_url=None, redoc_url=None, openapi_url=None,
+)
+
+_HEALTH_BODY = f"{APP_NAME} is up".encode()
+
+# HEAD too: Flask answered it automatically and uptime probes often use it
+@app.api_route("/", methods=["GET", "HEAD"])
+async def health():
+    return Response(content=_HEALTH_BODY, media_type="text/plain")
+
+@app.post("/whatsapp")
+async def whatsapp_webhook(From: str = Form(""), Body: str = Form("")):
+    wa_from, body = From, Body
     if not wa_from:
-        abort(400)
+        raise HTTPException(status_code=400)
 
-    sess = session_for(wa_from)
+    sess = await session_for(wa_from)
     sess["id"] = wa_from
     sess["history"].append(("user", body))
 
-    msg = trivial_intents(body, sess)
-    if not msg:
-        msg = ai_answer(body, sess)
+    msg = await trivial_intents(body, sess)
+    if not msg and is_askable(body):
+        msg = await ai_answer(body, sess)
     if not msg:
-        msg = "I didn’t catch that. Here’s the menu:\n\n" + small_menu()
+        msg = NO_MATCH_TEXT
 
     sess["history"].append(("bot", msg))
-    return reply_text(msg)
+    if sess["last_intent"] != "stop":
+        await save_session(wa_from, sess)
+    twiml = _CANNED_TWIML.get(msg) or reply_text(msg)
+    return Response(content=twiml, media_type="application/xml")
 
 
 if __name__ == "__main__":
+    import uvicorn
+
     port = int(os.getenv("PORT", "8080"))
-    app.run(host="0.0.0.0", port=port)
+    uvicorn.run(app, host="0.0.0.0", port=port)
@@ -0,0 +1,25 @@
+# Production server config: gunicorn process manager + uvicorn (ASGI) workers.
+# Run with: gunicorn app:app -c gunicorn.conf.py
+import os
+from multiprocessing import cpu_count
+from dotenv import load_dotenv
+
+load_dotenv()  # same .env the app reads, so REDIS_URL there is seen here too
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
+
+# Without Redis, sessions, the AI cache and admin stats/reset are per-process,
+# so more than one worker would split a conversation across separate stores.
+REDIS_URL = os.getenv("REDIS_URL", "").strip()
+default_workers = (2 * cpu_count()) + 1 if REDIS_URL else 1
+workers = int(os.getenv("WEB_CONCURRENCY", default_workers))
+# uvicorn picks uvloop automatically when it's installed (uvicorn[standard])
+worker_class = "uvicorn_worker.UvicornWorker"
+keepalive = 5
+
+
+def on_starting(server):
+    if workers > 1 and not REDIS_URL:
+        server.log.warning(
+            "Running %d workers without REDIS_URL: each worker keeps its own sessions.", workers
+        )